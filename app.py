@@ -1,14 +1,20 @@
 import streamlit as st
 import pandas as pd
+import polars as pl
 import requests
-import time
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import aiohttp
+import asyncio
+import orjson
+import msgspec
 import re
+import zlib
 from datetime import datetime
 from io import BytesIO
 import plotly.express as px
 import plotly.graph_objects as go
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 import base64
 
 # 页面配置
@@ -83,41 +89,174 @@ st.markdown("""
 st.markdown('<h1 class="main-header">🛍️ Shopee评论爬取分析工具</h1>', unsafe_allow_html=True)
 st.markdown('<p class="sub-header">高效提取、分析Shopee商品评论数据</p>', unsafe_allow_html=True)
 
+# 请求配置
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'application/json',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Referer': 'https://shopee.co.id/',
+}
+API_CONCURRENCY = 8  # 同时进行的分页请求数
+API_RATE_PER_SECOND = 4  # 令牌桶补充速率（请求/秒）
+API_MAX_RETRIES = 3  # 429/5xx 最大重试次数
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+PROGRESS_UPDATE_INTERVAL = 0.2  # 进度条刷新间隔（秒）
+BROWSER_MAX_SCROLLS = 30  # 浏览器模拟最多滚动次数
+BROWSER_IDLE_ROUNDS = 3  # 连续无新评论请求的滚动次数上限
+BROWSER_NETWORKIDLE_TIMEOUT = 10000  # 等待页面网络空闲的超时（毫秒）
+
+# 预编译正则
+_URL_ID_PATTERNS = [re.compile(p) for p in (
+    r'i\.(\d+)\.(\d+)',  # 标准Shopee URL模式
+    r'item/(\d+)/(\d+)',  # 另一种模式
+    r'shopid=(\d+)&itemid=(\d+)',  # 参数模式
+)]
+_SHOPID_RE = re.compile(r'"shopid"\s*:\s*(\d+)')
+_ITEMID_RE = re.compile(r'"itemid"\s*:\s*(\d+)')
+# 浏览器模拟时拦截的图片、字体、视频资源
+_BROWSER_BLOCKED_ASSETS_RE = re.compile(r'\.(png|jpe?g|gif|webp|svg|ico|woff2?|ttf|otf|mp4|webm)(\?|$)', re.IGNORECASE)
+
+# 情感关键词
+POSITIVE_WORDS = ['bagus', 'baik', 'mantap', 'puas', 'recommended', 'suka', 'senang', 'glowing', 'cerah']
+NEGATIVE_WORDS = ['jelek', 'buruk', 'kecewa', 'tidak', 'gagal', 'rusak', 'palsu']
+_POSITIVE_RE = re.compile('|'.join(map(re.escape, POSITIVE_WORDS)))
+_NEGATIVE_RE = re.compile('|'.join(map(re.escape, NEGATIVE_WORDS)))
+
+# 评论数据列（按列存储，直接构建DataFrame）
+REVIEW_COLUMNS = (
+    'username', 'time', 'rating', 'comment', 'variation',
+    'seller_response', 'like_count', 'images_count', 'source'
+)
+
+
+def new_review_columns() -> Dict[str, List]:
+    """创建空的按列存储评论容器"""
+    return {column: [] for column in REVIEW_COLUMNS}
+
+
+def orjson_default(obj):
+    """序列化orjson不支持的pandas类型"""
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    raise TypeError(f"无法序列化类型: {type(obj).__name__}")
+
+
+def append_review_row(columns: Dict[str, List], row: tuple):
+    """按REVIEW_COLUMNS顺序追加一行评论"""
+    for column, value in zip(REVIEW_COLUMNS, row):
+        columns[column].append(value)
+
+
+# 评论API响应结构（msgspec直接解码为定长字段，未声明的字段会被忽略）
+class SellerReply(msgspec.Struct):
+    comment: Optional[str] = None
+
+
+class ProductItem(msgspec.Struct):
+    model_name: Optional[str] = None
+
+
+class Rating(msgspec.Struct):
+    author_username: Optional[str] = None
+    author_portrait: Optional[str] = None
+    rating_star: Any = 0  # 数值字段不限定类型，在parse_review中转换
+    comment: Optional[str] = None
+    ctime: Any = 0
+    like_count: Any = 0
+    images: Optional[list] = None
+    product_items: Optional[List[ProductItem]] = None
+    seller_reply: Optional[SellerReply] = None
+    cmtid: Any = ''
+    detailed_rating: Any = None
+
+
+class RatingsData(msgspec.Struct):
+    ratings: Optional[List[Rating]] = None
+
+
+class RatingsResponse(msgspec.Struct):
+    error: Any = None
+    data: Optional[RatingsData] = None
+
+
+_RATINGS_DECODER = msgspec.json.Decoder(RatingsResponse)
+
+
+def response_ratings(response: RatingsResponse) -> List[Rating]:
+    """取出响应中的评论列表，缺失时返回空列表"""
+    return (response.data.ratings if response.data else None) or []
+
+
+class AsyncTokenBucket:
+    """异步令牌桶限速器，替代固定的 time.sleep 延迟"""
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens: Optional[asyncio.Queue] = None
+        self._refill_task: Optional[asyncio.Task] = None
+    
+    async def __aenter__(self):
+        self._tokens = asyncio.Queue(maxsize=self.capacity)
+        for _ in range(self.capacity):
+            self._tokens.put_nowait(None)
+        self._refill_task = asyncio.create_task(self._refill())
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self._refill_task.cancel()
+        try:
+            await self._refill_task
+        except asyncio.CancelledError:
+            pass
+    
+    async def _refill(self):
+        """按固定间隔补充令牌，桶满时丢弃"""
+        while True:
+            await asyncio.sleep(1 / self.rate)
+            if not self._tokens.full():
+                self._tokens.put_nowait(None)
+    
+    async def acquire(self):
+        """获取一个令牌，桶空时等待补充"""
+        await self._tokens.get()
+
+
 class ShopeeReviewScraper:
     """Shopee评论爬取器"""
     
     def __init__(self):
         self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'application/json',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Referer': 'https://shopee.co.id/',
-        })
+        self.session.headers.update(DEFAULT_HEADERS)
+        
+        # 扩大连接池，避免连接被回收导致重复TLS握手
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=64,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     
     def extract_ids_from_url(self, url: str) -> tuple:
         """从URL提取商品ID和店铺ID"""
         try:
             # 方法1：从URL模式提取
-            patterns = [
-                r'i\.(\d+)\.(\d+)',  # 标准Shopee URL模式
-                r'item/(\d+)/(\d+)',  # 另一种模式
-                r'shopid=(\d+)&itemid=(\d+)',  # 参数模式
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, url)
+            for pattern in _URL_ID_PATTERNS:
+                match = pattern.search(url)
                 if match:
                     shop_id, item_id = match.groups()
                     return shop_id, item_id
             
             # 方法2：尝试从HTML页面提取（如果提供了完整URL）
             if url.startswith('http'):
-                response = self.session.get(url, timeout=10)
+                response = self.session.get(url, timeout=10, stream=False)
                 # 查找商品ID和店铺ID
                 html = response.text
-                shop_id_match = re.search(r'"shopid"\s*:\s*(\d+)', html)
-                item_id_match = re.search(r'"itemid"\s*:\s*(\d+)', html)
+                shop_id_match = _SHOPID_RE.search(html)
+                item_id_match = _ITEMID_RE.search(html)
                 
                 if shop_id_match and item_id_match:
                     return shop_id_match.group(1), item_id_match.group(1)
@@ -128,278 +267,312 @@ class ShopeeReviewScraper:
             st.warning(f"URL解析失败: {str(e)}")
             return None, None
     
-    def fetch_reviews_api(self, shop_id: str, item_id: str, limit: int = 100) -> List[Dict]:
+    def fetch_reviews_api(self, shop_id: str, item_id: str, limit: int = 100) -> Dict[str, List]:
         """通过API获取评论数据"""
-        all_reviews = []
+        all_reviews = new_review_columns()
         
         try:
-            # Shopee评论API（印尼站）
-            base_url = "https://shopee.co.id/api/v2/item/get_ratings"
-            
-            offset = 0
-            batch_size = 20  # 每页20条
-            
             with st.spinner("正在爬取评论数据..."):
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                while offset < limit:
-                    params = {
-                        'itemid': item_id,
-                        'shopid': shop_id,
-                        'offset': offset,
-                        'limit': batch_size,
-                        'type': 0,  # 所有评论
-                        'filter': 0,  # 所有类型
-                        'flag': 1
-                    }
+                all_reviews = asyncio.run(self._fetch_reviews_api_async(shop_id, item_id, limit))
+        except Exception as e:
+            st.error(f"爬取过程出错: {str(e)}")
+        
+        return all_reviews
+    
+    async def _fetch_reviews_api_async(self, shop_id: str, item_id: str, limit: int) -> Dict[str, List]:
+        """按批并发请求分页，按offset顺序合并结果，遇到不满一页的分页即停止"""
+        all_reviews = new_review_columns()
+        
+        # Shopee评论API（印尼站）
+        base_url = "https://shopee.co.id/api/v2/item/get_ratings"
+        batch_size = 20  # 每页20条
+        offsets = list(range(0, limit, batch_size))
+        
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        fetched = {'pages': 0, 'reviews': 0}
+        
+        connector = aiohttp.TCPConnector(limit_per_host=API_CONCURRENCY)
+        timeout = aiohttp.ClientTimeout(total=15)
+        
+        async def fetch_page(http: aiohttp.ClientSession, bucket: AsyncTokenBucket, offset: int) -> tuple:
+            params = {
+                'itemid': item_id,
+                'shopid': shop_id,
+                'offset': offset,
+                'limit': batch_size,
+                'type': 0,  # 所有评论
+                'filter': 0,  # 所有类型
+                'flag': 1
+            }
+            
+            for attempt in range(API_MAX_RETRIES + 1):
+                await bucket.acquire()
+                async with http.get(base_url, params=params) as response:
+                    if response.status in RETRY_STATUS_CODES and attempt < API_MAX_RETRIES:
+                        # 指数退避后重试
+                        await asyncio.sleep(2 ** attempt)
+                        continue
                     
-                    try:
-                        response = self.session.get(base_url, params=params, timeout=15)
-                        
-                        if response.status_code == 200:
-                            data = response.json()
-                            
-                            if data.get('error'):
-                                st.error(f"API错误: {data.get('error', '未知错误')}")
-                                break
-                            
-                            ratings = data.get('data', {}).get('ratings', [])
-                            
-                            if not ratings:
-                                break  # 没有更多数据
-                            
-                            for rating in ratings:
-                                review = self.parse_review(rating)
-                                if review:
-                                    all_reviews.append(review)
-                            
-                            # 更新进度
-                            progress = min(100, int((offset / limit) * 100))
-                            progress_bar.progress(progress)
-                            status_text.text(f"已获取 {len(all_reviews)} 条评论...")
-                            
-                            offset += batch_size
-                            
-                            # 延迟避免被封
-                            time.sleep(0.5)
-                            
-                        else:
-                            st.warning(f"请求失败: HTTP {response.status_code}")
-                            break
-                            
-                    except Exception as e:
-                        st.error(f"请求出错: {str(e)}")
-                        break
+                    data, decode_error = None, None
+                    if response.status == 200:
+                        try:
+                            data = _RATINGS_DECODER.decode(await response.read())
+                        except msgspec.ValidationError as e:
+                            decode_error = str(e)
+                    break
+            
+            # 只更新计数，界面由report_progress统一刷新
+            fetched['pages'] += 1
+            if data:
+                fetched['reviews'] += len(response_ratings(data))
+            
+            return response.status, data, decode_error
+        
+        def merge_pages(results: list) -> bool:
+            # 按offset顺序合并一批分页，返回是否还需要请求下一批
+            for result in results:
+                if isinstance(result, Exception):
+                    st.error(f"请求出错: {str(result)}")
+                    return False
                 
-                progress_bar.progress(100)
-                status_text.text(f"完成！共获取 {len(all_reviews)} 条评论")
+                status, data, decode_error = result
+                if status != 200:
+                    st.warning(f"请求失败: HTTP {status}")
+                    return False
                 
-        except Exception as e:
-            st.error(f"爬取过程出错: {str(e)}")
+                if decode_error:
+                    # 单页数据格式异常只跳过该页，不影响后续分页
+                    st.warning(f"解析分页失败: {decode_error}")
+                    continue
+                
+                if data.error:
+                    st.error(f"API错误: {data.error}")
+                    return False
+                
+                ratings = response_ratings(data)
+                for rating in ratings:
+                    self.parse_review(rating, all_reviews)
+                
+                if len(ratings) < batch_size:
+                    return False  # 没有更多数据
+            
+            return True
+        
+        async def report_progress():
+            # 定时刷新进度，避免每个分页都触发一次界面更新
+            shown = None
+            while True:
+                if fetched != shown:
+                    shown = dict(fetched)
+                    progress_bar.progress(min(100, int((shown['pages'] / len(offsets)) * 100)))
+                    status_text.text(f"已获取 {shown['reviews']} 条评论...")
+                await asyncio.sleep(PROGRESS_UPDATE_INTERVAL)
+        
+        reporter = asyncio.create_task(report_progress())
+        try:
+            async with aiohttp.ClientSession(headers=DEFAULT_HEADERS, connector=connector, timeout=timeout) as http:
+                async with AsyncTokenBucket(API_RATE_PER_SECOND, API_CONCURRENCY) as bucket:
+                    # 每批最多API_CONCURRENCY个分页，商品评论较少时只发出少量请求
+                    for start in range(0, len(offsets), API_CONCURRENCY):
+                        wave = offsets[start:start + API_CONCURRENCY]
+                        results = await asyncio.gather(
+                            *(fetch_page(http, bucket, offset) for offset in wave),
+                            return_exceptions=True
+                        )
+                        if not merge_pages(results):
+                            break
+        finally:
+            reporter.cancel()
+        
+        progress_bar.progress(100)
+        status_text.text(f"完成！共获取 {len(all_reviews['username'])} 条评论")
         
         return all_reviews
     
-    def fetch_reviews_selenium(self, url: str, max_reviews: int = 100) -> List[Dict]:
-        """使用Selenium模拟浏览器获取评论（备用方法）"""
+    def fetch_reviews_browser(self, url: str, max_reviews: int = 100) -> Dict[str, List]:
+        """使用Playwright模拟浏览器获取评论（备用方法）"""
         try:
-            # 这里需要安装selenium和webdriver
-            from selenium import webdriver
-            from selenium.webdriver.common.by import By
-            from selenium.webdriver.support.ui import WebDriverWait
-            from selenium.webdriver.support import expected_conditions as EC
-            from selenium.webdriver.chrome.options import Options
+            # 这里需要安装playwright和chromium
+            from playwright import async_api as playwright_api
             
             st.info("正在启动浏览器模拟...")
-            
-            # 设置Chrome选项
-            chrome_options = Options()
-            chrome_options.add_argument('--headless')  # 无头模式
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            chrome_options.add_experimental_option('useAutomationExtension', False)
-            
-            driver = webdriver.Chrome(options=chrome_options)
-            driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-            
-            driver.get(url)
-            time.sleep(3)
-            
-            reviews = []
-            
-            # 这里需要根据实际页面结构调整选择器
-            # 由于页面结构可能变化，这只是一个示例
-            try:
-                review_elements = driver.find_elements(By.CSS_SELECTOR, 'div[class*="product-review"]')
-                
-                for element in review_elements[:max_reviews]:
-                    try:
-                        # 解析评论元素
-                        review_data = self.parse_review_element(element)
-                        if review_data:
-                            reviews.append(review_data)
-                    except:
-                        continue
-                        
-            except Exception as e:
-                st.warning(f"解析页面失败: {str(e)}")
-            
-            driver.quit()
-            return reviews
+            return asyncio.run(self._fetch_reviews_browser_async(playwright_api, url, max_reviews))
             
         except ImportError:
-            st.error("需要安装selenium: pip install selenium")
-            return []
+            st.error("需要安装playwright: pip install playwright && playwright install chromium")
+            return new_review_columns()
         except Exception as e:
-            st.error(f"Selenium爬取失败: {str(e)}")
-            return []
+            st.error(f"浏览器模拟爬取失败: {str(e)}")
+            return new_review_columns()
+    
+    async def _fetch_reviews_browser_async(self, playwright_api, url: str, max_reviews: int) -> Dict[str, List]:
+        """打开商品页并截获评论API响应，复用parse_review解析"""
+        reviews = new_review_columns()
+        captured = []
+        
+        def capture_ratings(response):
+            if '/api/v2/item/get_ratings' in response.url and response.ok:
+                captured.append(response)
+        
+        async with playwright_api.async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            try:
+                context = await browser.new_context(user_agent=DEFAULT_HEADERS['User-Agent'])
+                page = await context.new_page()
+                # 只有匹配资源后缀的请求才进入回调，图片、字体等与评论无关，直接拦截以加快加载
+                await page.route(_BROWSER_BLOCKED_ASSETS_RE, lambda route: route.abort())
+                page.on('response', capture_ratings)
+                
+                await page.goto(url)
+                try:
+                    await page.wait_for_load_state('networkidle', timeout=BROWSER_NETWORKIDLE_TIMEOUT)
+                except playwright_api.TimeoutError:
+                    # 页面持续轮询时不会进入网络空闲，继续处理已截获的响应
+                    pass
+                
+                parsed = 0
+                idle_rounds = 0
+                for _ in range(BROWSER_MAX_SCROLLS):
+                    # 解析新截获的评论响应
+                    new_responses, parsed = captured[parsed:], len(captured)
+                    for response in new_responses:
+                        try:
+                            data = _RATINGS_DECODER.decode(await response.body())
+                        except Exception:
+                            continue
+                        for rating in response_ratings(data):
+                            if len(reviews['username']) >= max_reviews:
+                                break
+                            self.parse_review(rating, reviews, source='browser')
+                    
+                    if len(reviews['username']) >= max_reviews:
+                        break
+                    
+                    # 连续多次滚动都没有新的评论请求，认为已到底
+                    idle_rounds = 0 if new_responses else idle_rounds + 1
+                    if idle_rounds >= BROWSER_IDLE_ROUNDS:
+                        break
+                    
+                    # 滚动页面触发评论加载
+                    await page.mouse.wheel(0, 2000)
+                    await page.wait_for_timeout(1000)
+            finally:
+                await browser.close()
+        
+        return reviews
     
-    def parse_review(self, rating_data: Dict) -> Optional[Dict]:
-        """解析API返回的评论数据"""
+    def parse_review(self, rating_data: Rating, columns: Dict[str, List], source: str = 'api') -> bool:
+        """解析API返回的评论数据，追加到按列存储的容器中"""
         try:
             # 提取用户信息
-            username = rating_data.get('author_username', '')
+            username = rating_data.author_username
             if not username or username == 'null':
-                username = rating_data.get('author_portrait', '').split('/')[-1].split('.')[0]
+                username = (rating_data.author_portrait or '').split('/')[-1].split('.')[0]
             
             # 处理匿名用户
             if not username or len(username) < 2:
-                username = f"用户_{hash(rating_data.get('cmtid', '')) % 10000:04d}"
+                username = f"用户_{zlib.crc32(str(rating_data.cmtid).encode()) % 10000:04d}"
             
             # 评分
-            rating = rating_data.get('rating_star', 0)
+            rating = int(rating_data.rating_star or 0)
             
             # 评论内容
-            comment = rating_data.get('comment', '')
+            comment = rating_data.comment
             if not comment or comment == 'null':
-                comment = rating_data.get('detailed_rating', [{}])[0].get('comment', '') if rating_data.get('detailed_rating') else ''
+                detailed_rating = rating_data.detailed_rating
+                comment = detailed_rating[0].get('comment', '') if detailed_rating else ''
             
-            # 时间戳转换
-            ctime = rating_data.get('ctime', 0)
-            if ctime:
-                try:
-                    review_time = datetime.fromtimestamp(ctime).strftime('%Y-%m-%d %H:%M')
-                except:
-                    review_time = str(ctime)
-            else:
-                review_time = '未知时间'
+            # 时间戳（秒），构建DataFrame时整列转换
+            review_time = int(rating_data.ctime) if rating_data.ctime else None
             
             # 产品变体
-            product_items = rating_data.get('product_items', [{}])
-            variation = product_items[0].get('model_name', '') if product_items else ''
+            product_items = rating_data.product_items
+            variation = (product_items[0].model_name or '') if product_items else ''
             
             # 卖家回复
             seller_response = ''
-            if rating_data.get('seller_reply'):
-                seller_response = rating_data['seller_reply'].get('comment', '')
+            if rating_data.seller_reply:
+                seller_response = rating_data.seller_reply.comment or ''
             
             # 点赞数
-            like_count = rating_data.get('like_count', 0)
-            
-            return {
-                'username': username,
-                'time': review_time,
-                'rating': rating,
-                'comment': comment,
-                'variation': variation,
-                'seller_response': seller_response,
-                'like_count': like_count,
-                'images_count': len(rating_data.get('images', [])),
-                'source': 'api'
-            }
+            like_count = int(rating_data.like_count or 0)
+            
+            # 图片数量
+            images = rating_data.images
+            images_count = len(images) if images else 0
+            
+            append_review_row(columns, (
+                username,
+                review_time,
+                rating,
+                comment,
+                variation,
+                seller_response,
+                like_count,
+                images_count,
+                source
+            ))
+            return True
             
         except Exception as e:
             st.warning(f"解析评论失败: {str(e)}")
-            return None
-    
-    def parse_review_element(self, element) -> Optional[Dict]:
-        """解析Selenium获取的评论元素"""
-        try:
-            # 这里需要根据实际页面结构调整
-            # 由于页面结构可能变化，这只是一个示例解析逻辑
-            text = element.text
-            
-            # 提取用户名（通常以*号隐藏部分字符）
-            username_match = re.search(r'^([^*\n]+)', text)
-            username = username_match.group(1).strip() if username_match else '匿名用户'
-            
-            # 提取评分（通过★符号数量）
-            stars = text.count('★')
-            rating = stars if 1 <= stars <= 5 else 5
-            
-            # 提取日期
-            date_match = re.search(r'(\d{4}-\d{2}-\d{2})', text)
-            review_time = date_match.group(1) if date_match else '未知时间'
-            
-            # 提取评论内容（简化提取）
-            lines = text.split('\n')
-            comment_lines = []
-            in_comment = False
-            
-            for line in lines:
-                if line.strip() and not line.startswith(username) and not re.match(r'\d{4}-\d{2}-\d{2}', line):
-                    if 'Variation:' not in line and 'Seller' not in line:
-                        comment_lines.append(line.strip())
-            
-            comment = ' '.join(comment_lines[:3])  # 只取前3行
-            
-            return {
-                'username': username,
-                'time': review_time,
-                'rating': rating,
-                'comment': comment[:200],  # 限制长度
-                'variation': '',
-                'seller_response': '',
-                'like_count': 0,
-                'images_count': 0,
-                'source': 'selenium'
-            }
-            
-        except Exception as e:
-            return None
+            return False
     
     def analyze_reviews(self, reviews_df):
         """分析评论数据"""
-        analysis = {}
-        
-        if reviews_df.empty:
-            return analysis
-        
-        # 基本统计
-        analysis['total_reviews'] = len(reviews_df)
-        analysis['avg_rating'] = reviews_df['rating'].mean()
-        
-        # 评分分布
-        rating_counts = reviews_df['rating'].value_counts().sort_index()
-        analysis['rating_distribution'] = rating_counts
-        
-        # 时间分析（如果有时间数据）
-        if 'time' in reviews_df.columns and pd.api.types.is_datetime64_any_dtype(reviews_df['time']):
-            reviews_df['date'] = reviews_df['time'].dt.date
-            daily_counts = reviews_df['date'].value_counts().sort_index()
-            analysis['daily_trend'] = daily_counts
-        
-        # 评论长度分析
-        reviews_df['comment_length'] = reviews_df['comment'].apply(len)
-        analysis['avg_comment_length'] = reviews_df['comment_length'].mean()
-        
-        # 情感关键词（简单版）
-        positive_words = ['bagus', 'baik', 'mantap', 'puas', 'recommended', 'suka', 'senang', 'glowing', 'cerah']
-        negative_words = ['jelek', 'buruk', 'kecewa', 'tidak', 'gagal', 'rusak', 'palsu']
-        
-        reviews_df['positive_score'] = reviews_df['comment'].apply(
-            lambda x: sum(1 for word in positive_words if word.lower() in x.lower())
+        return _analyze(reviews_df)
+
+
+def _hash_dataframe(df: pd.DataFrame) -> bytes:
+    """按内容计算DataFrame哈希，用作缓存键"""
+    return pd.util.hash_pandas_object(df, index=True).values.tobytes()
+
+
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=32, hash_funcs={pd.DataFrame: _hash_dataframe})
+def _analyze(reviews_df: pd.DataFrame) -> Dict:
+    """分析评论数据（使用Polars聚合，按DataFrame内容缓存，不修改传入的DataFrame）"""
+    analysis = {}
+    
+    if reviews_df.empty:
+        return analysis
+    
+    if 'comment_length' not in reviews_df.columns:
+        reviews_df = reviews_df.assign(comment_length=reviews_df['comment'].str.len())
+    pdf = pl.from_pandas(reviews_df[['rating', 'time', 'comment', 'comment_length']])
+    
+    # 基本统计、评论长度与情感关键词（简单版）在同一个查询中完成
+    # 关键词用(?i)正则匹配，无需先生成小写副本
+    stats = pdf.select(
+        pl.len().alias('total_reviews'),
+        pl.col('rating').mean().alias('avg_rating'),
+        pl.col('comment_length').mean().alias('avg_comment_length'),
+        pl.col('comment').str.contains(f"(?i){_POSITIVE_RE.pattern}").sum().alias('positive_count'),
+        pl.col('comment').str.contains(f"(?i){_NEGATIVE_RE.pattern}").sum().alias('negative_count'),
+    ).row(0, named=True)
+    analysis.update(stats)
+    
+    # 评分分布
+    rating_counts = pdf.group_by('rating').len()
+    analysis['rating_distribution'] = pd.Series(
+        rating_counts['len'].to_numpy(),
+        index=rating_counts['rating'].to_numpy()
+    ).reindex(range(1, 6), fill_value=0)
+    
+    # 时间分析（如果有时间数据）
+    if pdf.schema['time'] == pl.Datetime and pdf['time'].null_count() < pdf.height:
+        daily_counts = (
+            pdf.drop_nulls('time')
+            .group_by(pl.col('time').dt.date().alias('date'))
+            .len()
+            .sort('date')
         )
-        reviews_df['negative_score'] = reviews_df['comment'].apply(
-            lambda x: sum(1 for word in negative_words if word.lower() in x.lower())
+        analysis['daily_trend'] = pd.Series(
+            daily_counts['len'].to_numpy(),
+            index=daily_counts['date'].to_list()
         )
-        
-        analysis['positive_count'] = (reviews_df['positive_score'] > 0).sum()
-        analysis['negative_count'] = (reviews_df['negative_score'] > 0).sum()
-        
-        return analysis
+    
+    return analysis
 
 def main():
     """主函数"""
@@ -444,10 +617,10 @@ def main():
         max_reviews = st.slider("最大评论数", 10, 1000, 100, 10)
         
         use_api = st.checkbox("使用API爬取（推荐）", value=True)
-        use_selenium = st.checkbox("使用浏览器模拟（备用）", value=False)
+        use_browser = st.checkbox("使用浏览器模拟（备用）", value=False)
         
-        if use_selenium:
-            st.warning("Selenium需要额外安装，速度较慢")
+        if use_browser:
+            st.warning("浏览器模拟需要额外安装Playwright，速度较慢")
         
         st.markdown("### 💾 导出选项")
         export_format = st.multiselect(
@@ -460,8 +633,6 @@ def main():
         
         if st.button("🚀 开始爬取", type="primary", use_container_width=True):
             st.session_state.start_scraping = True
-        else:
-            st.session_state.start_scraping = False
     
     # 主界面
     col1, col2 = st.columns([2, 1])
@@ -486,36 +657,37 @@ def main():
             st.metric("平均评分", f"{df['rating'].mean():.1f} ⭐")
             st.metric("有图片的评论", f"{df[df['images_count'] > 0].shape[0]} 条")
     
-    # 爬取按钮触发
-    if st.session_state.get('start_scraping', False) and shop_id and item_id:
+    # 爬取按钮触发（读取后立即消费标记，避免后续重跑再次爬取）
+    start_scraping = st.session_state.get('start_scraping', False)
+    st.session_state.start_scraping = False
+    
+    if start_scraping and shop_id and item_id:
         st.markdown("---")
         st.markdown("### 🔍 正在爬取评论...")
         
-        # 清空之前的缓存
-        if 'reviews_df' in st.session_state:
-            del st.session_state.reviews_df
-        
         # 爬取评论
-        reviews = []
+        reviews = new_review_columns()
         
         if use_api:
             reviews = scraper.fetch_reviews_api(shop_id, item_id, max_reviews)
         
-        if use_selenium and len(reviews) < max_reviews:
+        if use_browser and len(reviews['username']) < max_reviews:
             if product_url:
-                selenium_reviews = scraper.fetch_reviews_selenium(product_url, max_reviews - len(reviews))
-                reviews.extend(selenium_reviews)
+                browser_reviews = scraper.fetch_reviews_browser(product_url, max_reviews - len(reviews['username']))
+                for column in REVIEW_COLUMNS:
+                    reviews[column].extend(browser_reviews[column])
         
-        if reviews:
-            # 转换为DataFrame
-            reviews_df = pd.DataFrame(reviews)
+        if reviews['username']:
+            # 时间列转换（整列秒级时间戳一次完成）
+            reviews['time'] = pd.to_datetime(reviews['time'], unit='s', errors='coerce')
             
-            # 时间列转换
-            if 'time' in reviews_df.columns:
-                reviews_df['time'] = pd.to_datetime(reviews_df['time'], errors='coerce')
+            # 转换为DataFrame
+            reviews_df = pd.DataFrame(reviews, copy=False)
+            reviews_df['comment_length'] = reviews_df['comment'].str.len()
             
             # 保存到session
             st.session_state.reviews_df = reviews_df
+            st.session_state.analysis = scraper.analyze_reviews(reviews_df)
             
             # 显示成功信息
             st.success(f"✅ 成功爬取 {len(reviews_df)} 条评论！")
@@ -535,10 +707,11 @@ def main():
             col1, col2 = st.columns(2)
             
             with col1:
+                rating_counts = st.session_state.analysis['rating_distribution']
                 fig1 = go.Figure(data=[
                     go.Pie(
-                        labels=[f'{i}星' for i in range(1, 6)],
-                        values=[(reviews_df['rating'] == i).sum() for i in range(1, 6)],
+                        labels=[f'{i}星' for i in rating_counts.index],
+                        values=rating_counts.values,
                         hole=.3,
                         marker_colors=['#ff6b6b', '#ffa726', '#ffd166', '#06d6a0', '#118ab2']
                     )
@@ -548,7 +721,6 @@ def main():
             
             with col2:
                 # 评论长度分布
-                reviews_df['comment_length'] = reviews_df['comment'].apply(len)
                 fig2 = px.histogram(
                     reviews_df, 
                     x='comment_length',
@@ -560,9 +732,8 @@ def main():
                 st.plotly_chart(fig2, use_container_width=True)
             
             # 时间趋势（如果有时间数据）
-            if 'time' in reviews_df.columns and not reviews_df['time'].isna().all():
-                reviews_df['date'] = reviews_df['time'].dt.date
-                daily_counts = reviews_df['date'].value_counts().sort_index()
+            if 'daily_trend' in st.session_state.analysis:
+                daily_counts = st.session_state.analysis['daily_trend']
                 
                 fig3 = px.line(
                     x=daily_counts.index,
@@ -580,7 +751,9 @@ def main():
             # CSV导出
             if "CSV" in export_format:
                 with col1:
-                    csv = reviews_df.to_csv(index=False).encode('utf-8-sig')
+                    csv_buffer = BytesIO()
+                    reviews_df.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
+                    csv = csv_buffer.getvalue()
                     st.download_button(
                         label="📥 下载CSV",
                         data=csv,
@@ -594,17 +767,19 @@ def main():
                 with col2:
                     # 使用BytesIO创建Excel文件
                     output = BytesIO()
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                    with pd.ExcelWriter(output, engine='xlsxwriter', engine_kwargs={'options': {'strings_to_urls': False}}) as writer:
                         reviews_df.to_excel(writer, index=False, sheet_name='评论数据')
                         
-                        # 添加汇总表
+                        # 添加汇总表（复用已计算的分析结果和comment_length列）
+                        analysis = st.session_state.analysis
+                        length_stats = reviews_df['comment_length'].agg(['max', 'min'])
                         summary_df = pd.DataFrame({
                             '统计项': ['总评论数', '平均评分', '最长评论', '最短评论'],
                             '值': [
-                                len(reviews_df),
-                                f"{reviews_df['rating'].mean():.2f}",
-                                reviews_df['comment'].apply(len).max(),
-                                reviews_df['comment'].apply(len).min()
+                                analysis['total_reviews'],
+                                f"{analysis['avg_rating']:.2f}",
+                                length_stats['max'],
+                                length_stats['min']
                             ]
                         })
                         summary_df.to_excel(writer, index=False, sheet_name='数据汇总')
@@ -622,7 +797,11 @@ def main():
             # JSON导出
             if "JSON" in export_format:
                 with col3:
-                    json_str = reviews_df.to_json(orient='records', force_ascii=False, indent=2)
+                    json_str = orjson.dumps(
+                        reviews_df.to_dict(orient='records'),
+                        default=orjson_default,
+                        option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+                    ).decode()
                     st.download_button(
                         label="📄 下载JSON",
                         data=json_str,
@@ -636,6 +815,10 @@ def main():
                 st.json(reviews_df.head(10).to_dict(orient='records'))
                 
         else:
+            # 本次爬取失败，清除上一次的结果，避免预览显示其他商品的数据
+            st.session_state.pop('reviews_df', None)
+            st.session_state.pop('analysis', None)
+            
             st.error("未能获取到评论数据，请尝试以下方法：")
             st.markdown("""
             1. 检查商品链接是否正确